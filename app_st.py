@@ -1,6 +1,9 @@
 # app_st.py - Streamlit application using Azure Functions API
 import os
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+import orjson
 import pandas as pd
 import numpy as np
 import streamlit as st
@@ -20,34 +23,82 @@ if 'user_ids' not in st.session_state:
 st.set_page_config(page_title="Système de Recommandation d'Articles", layout="wide")
 
 # API Call Functions
-@st.cache_data(ttl=300, show_spinner=False)
+@st.cache_resource
+def _session():
+    """Shared HTTP session, keeps connections to the API alive between calls"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+@st.cache_resource
+def _etag_store():
+    """Last (etag, body) received per URL, shared by all sessions"""
+    return {}
+
+def _parse_json(response):
+    """Parse a JSON response body"""
+    return orjson.loads(response.content)
+
+def _parse_ndjson(response):
+    """Parse an NDJSON response body line by line while it is downloaded"""
+    return [orjson.loads(line) for line in response.iter_lines() if line]
+
+def _get_json(url, timeout, parse=_parse_json):
+    """GET a JSON endpoint, revalidating the last response with If-None-Match"""
+    store = _etag_store()
+    cached = store.get(url)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    with _session().get(url, headers=headers, timeout=timeout, stream=True) as response:
+        if response.status_code == 304 and cached:
+            return cached[1]
+        response.raise_for_status()
+        body = parse(response)
+        etag = response.headers.get("ETag")
+    if etag:
+        store[url] = (etag, body)
+    return body
+
+@st.cache_data(ttl=600, show_spinner=False)
 def get_health_status(api_url):
     """Get API health status"""
     try:
-        response = requests.get(f"{api_url}/api/health", timeout=10)
-        response.raise_for_status()
-        return response.json()
+        return _get_json(f"{api_url}/api/health", timeout=10)
     except Exception as e:
         return {"status": "unhealthy", "error": str(e)}
 
-@st.cache_data(ttl=60, show_spinner=False)
+# Users only change when the API reloads its data
+@st.cache_data(ttl=86400, show_spinner=False)
 def get_users_list(api_url):
-    """Get list of users from API"""
-    try:
-        response = requests.get(f"{api_url}/api/users", timeout=30)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        st.error(f"Erreur lors de la récupération des utilisateurs : {e}")
-        return []
+    """Get list of users from API (raises on error, failures are not cached)"""
+    return _get_json(f"{api_url}/api/users?format=ndjson", timeout=30, parse=_parse_ndjson)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_users_map(api_url):
+    """Get users stats indexed by user_id"""
+    return {u['user_id']: u for u in get_users_list(api_url)}
+
+def get_health_and_users(api_url):
+    """Fetch health status and users list concurrently"""
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        health_future = executor.submit(get_health_status, api_url)
+        users_future = executor.submit(get_users_list, api_url)
+        health = health_future.result()
+        try:
+            users_data = users_future.result()
+        except Exception as e:
+            st.error(f"Erreur lors de la récupération des utilisateurs : {e}")
+            users_data = []
+    return health, users_data
 
 def get_recommendations(api_url, user_id, n=5):
     """Get recommendations for a user"""
     try:
         params = {'user_id': user_id, 'n': n, 'with_meta': 'true'}
-        response = requests.get(f"{api_url}/api/recommend", params=params, timeout=60)
+        response = _session().get(f"{api_url}/api/recommend", params=params, timeout=60)
         response.raise_for_status()
-        return response.json()
+        return orjson.loads(response.content)
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 404:
             st.error(f"L'utilisateur {user_id} n'existe pas dans la base de données.")
@@ -64,13 +115,15 @@ def get_recommendations(api_url, user_id, n=5):
 st.title("Système de Recommandation d'Articles")
 st.markdown("---")
 
+# Health and users list are independent, fetch them in parallel
+with st.spinner("Chargement de la liste des utilisateurs..."):
+    health, users_data = get_health_and_users(st.session_state.api_url)
+
 # Sidebar for information
 with st.sidebar:
     st.header("Informations")
 
     # API Status
-    health = get_health_status(st.session_state.api_url)
-
     if health.get('status') == 'healthy':
         st.success("API : Connectée")
         st.metric("Nombre d'utilisateurs", health.get('total_users', 0))
@@ -102,11 +155,8 @@ with st.sidebar:
     st.markdown("**Mode :** API Azure Functions")
 
 # Load users list if not already loaded
-if not st.session_state.user_ids:
-    with st.spinner("Chargement de la liste des utilisateurs..."):
-        users_data = get_users_list(st.session_state.api_url)
-        if users_data:
-            st.session_state.user_ids = [u['user_id'] for u in users_data]
+if not st.session_state.user_ids and users_data:
+    st.session_state.user_ids = [u['user_id'] for u in users_data]
 
 # Main section
 col1, col2 = st.columns([2, 1])
@@ -189,9 +239,9 @@ if submitted:
             st.markdown("---")
             st.subheader(f"Statistiques de l'utilisateur {user_id_input}")
 
-            # Get user stats from users list
-            users_data = get_users_list(st.session_state.api_url)
-            user_stats = next((u for u in users_data if u['user_id'] == user_id_input), None)
+            # Get user stats from the users list fetched above
+            users_map = get_users_map(st.session_state.api_url) if users_data else {}
+            user_stats = users_map.get(user_id_input)
 
             if user_stats:
                 col1, col2, col3 = st.columns(3)
@@ -207,7 +257,6 @@ if submitted:
 # Optional: Display users list
 if st.session_state.user_ids:
     with st.expander("Voir tous les utilisateurs disponibles (100 premiers)"):
-        users_data = get_users_list(st.session_state.api_url)
         if users_data:
             df_users = pd.DataFrame(users_data[:100])
             df_users.columns = ["ID Utilisateur", "Articles consultés", "Note moyenne"]
@@ -1,6 +1,40 @@
 # model/content_based.py
+import os
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy.sparse import csr_matrix
+
+# Optional, opt-in with SCORE_KERNEL=numba: a fused numba scoring kernel for
+# deployments whose numpy is not linked against an optimized BLAS. By default
+# scoring is a BLAS matrix-vector product.
+njit = None
+if os.environ.get("SCORE_KERNEL", "numpy").lower() == "numba":
+    try:
+        import numba
+        from numba import njit, prange
+        # Request threads may score concurrently; numba's fallback "workqueue"
+        # layer aborts the process on concurrent parallel launches
+        numba.config.THREADING_LAYER = "threadsafe"
+    except ImportError:
+        njit = None
+
+if njit is not None:
+    # No "nnan"/"ninf" fast-math flags: seen articles are scored -inf
+    @njit(parallel=True, fastmath={"reassoc", "contract", "arcp"})
+    def _score_kernel(embeddings_norm, unit_user, seen_mask):
+        """Dot every normalized article with the unit user vector, masking seen articles."""
+        n_articles, dim = embeddings_norm.shape
+        scores = np.empty(n_articles, dtype=np.float32)
+        for i in prange(n_articles):
+            if seen_mask[i]:
+                scores[i] = -np.inf
+            else:
+                acc = np.float32(0.0)
+                for j in range(dim):
+                    acc += embeddings_norm[i, j] * unit_user[j]
+                scores[i] = acc
+        return scores
+else:
+    _score_kernel = None
 
 class ContentBasedRecommender:
     """
@@ -24,52 +58,153 @@ class ContentBasedRecommender:
         self.embeddings = embeddings
         self.article_indices = article_indices
         self.article_ids = article_ids
-        self.user_profiles = {}
+        
+        # Article embeddings are static: L2-normalize them once for cosine scoring
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        # Scores are computed in the catalog dtype (float32 unless the embeddings are float16)
+        dtype = embeddings.dtype if embeddings.dtype == np.float16 else np.float32
+        self.embeddings_norm = np.ascontiguousarray(
+            embeddings / np.where(norms == 0, 1, norms), dtype=dtype
+        )
+        
+        self.profile_matrix = None
+        self.user_index = {}
+        self.seen_indptr = None
+        self.seen_indices = None
+        self.kernel_enabled = True
         
     def fit(self, ratings_df):
         """
         Build user profiles based on their article ratings.
         
+        Profiles are computed for all users at once as a weighted average of
+        article embeddings, using a sparse user x article rating matrix.
+        
         Parameters:
         ----------
         ratings_df : pandas.DataFrame
             DataFrame containing user_id, article_id, and rating columns
         """
-        # Group by user_id and create a profile for each user
-        for user_id, group in ratings_df.groupby('user_id'):
-            # Create user profile as weighted average of article embeddings
-            article_weights = {}
-            user_vector = np.zeros(self.embeddings.shape[1])
-            
-            # Calculate weights based on ratings
-            total_weight = 0
-            
-            for _, row in group.iterrows():
-                article_id = row['article_id']
-                rating = row['rating']
-                
-                # Skip if article not in our index
-                if article_id not in self.article_indices:
-                    continue
-                
-                # Get article embedding
-                article_idx = self.article_indices[article_id]
-                article_weights[article_id] = rating
-                
-                # Add weighted article vector to user profile
-                user_vector += rating * self.embeddings[article_idx]
-                total_weight += rating
-            
-            # Normalize user vector
-            if total_weight > 0:
-                user_vector /= total_weight
-                
-            self.user_profiles[user_id] = {
-                'vector': user_vector,
-                'article_weights': article_weights
-            }
+        # One row per user, in sorted user_id order
+        user_ids, user_rows = np.unique(ratings_df['user_id'].to_numpy(), return_inverse=True)
+        self.user_index = {user_id: row for row, user_id in enumerate(user_ids.tolist())}
+        
+        # Skip ratings whose article is not in our index
+        article_rows = ratings_df['article_id'].map(self.article_indices)
+        known = article_rows.notna().to_numpy()
+        
+        # Sparse rating matrix R (n_users x n_articles); duplicate clicks are summed.
+        # float32 weights (small integers, summed exactly) keep R @ embeddings in
+        # single precision, so the profile matrix is allocated once at its final size
+        R = csr_matrix(
+            (ratings_df['rating'].to_numpy(dtype=np.float32)[known],
+             (user_rows[known], article_rows[known].to_numpy(dtype=np.int64))),
+            shape=(len(user_ids), len(self.article_ids))
+        )
+        
+        # Weighted sum of article vectors, normalized by total weight per user
+        profiles = np.asarray(R @ self.embeddings)
+        total_weight = np.asarray(R.sum(axis=1))
+        profiles /= np.where(total_weight > 0, total_weight, 1)
+        
+        # Same dtype as the normalized catalog so scoring stays in single precision
+        self.profile_matrix = profiles.astype(self.embeddings_norm.dtype, copy=False)
+        
+        # Row u of R lists the articles user u has already interacted with
+        self.seen_indptr = R.indptr
+        self.seen_indices = R.indices
+        
+        self._warm_up()
+    
+    def export_profiles(self):
+        """
+        Fitted user profiles as a dict of arrays, to be restored with load_profiles.
+        """
+        return {
+            'user_ids': np.fromiter(self.user_index.keys(), dtype=np.int64, count=len(self.user_index)),
+            'profile_matrix': self.profile_matrix,
+            'seen_indptr': self.seen_indptr,
+            'seen_indices': self.seen_indices,
+        }
+    
+    def load_profiles(self, arrays):
+        """
+        Restore user profiles produced by export_profiles instead of calling fit.
+        
+        Parameters:
+        ----------
+        arrays : mapping
+            Mapping of array name to numpy.ndarray, as returned by export_profiles
+        """
+        self.user_index = {user_id: row for row, user_id in enumerate(arrays['user_ids'].tolist())}
+        self.profile_matrix = arrays['profile_matrix'].astype(self.embeddings_norm.dtype, copy=False)
+        self.seen_indptr = arrays['seen_indptr']
+        self.seen_indices = arrays['seen_indices']
+        self._warm_up()
+    
+    def _warm_up(self):
+        """Compile the numba kernel now rather than on the first request."""
+        if self._use_kernel() and len(self.user_index) > 0:
+            try:
+                _score_kernel(self.embeddings_norm[:1], self.profile_matrix[0], np.zeros(1, dtype=np.bool_))
+            except ValueError:
+                # No thread-safe layer (TBB or OpenMP) could be loaded: use the NumPy path
+                self.kernel_enabled = False
+    
+    def _use_kernel(self):
+        """The numba kernel is used when enabled, thread-safe and the catalog is float32."""
+        return (_score_kernel is not None and self.kernel_enabled
+                and self.embeddings_norm.dtype == np.float32)
+    
+    def _score_all(self, user_id):
+        """
+        Cosine similarity between a user profile and every article in the catalog.
+        
+        Articles the user has already interacted with are scored -inf.
+        Returns None if the user has no usable profile.
+        """
+        # If user not in profiles, there is nothing to score
+        if user_id not in self.user_index:
+            return None
+        
+        row = self.user_index[user_id]
+        user_vector = self.profile_matrix[row]
+        norm_user = np.linalg.norm(user_vector)
+        if norm_user == 0:
+            return None
+        
+        # Articles the user has already interacted with, precomputed in fit
+        seen_idx = self.seen_indices[self.seen_indptr[row]:self.seen_indptr[row + 1]]
+        
+        unit_user = (user_vector / norm_user).astype(self.embeddings_norm.dtype)
+        
+        if self._use_kernel():
+            seen_mask = np.zeros(len(self.article_ids), dtype=np.bool_)
+            seen_mask[seen_idx] = True
+            return _score_kernel(self.embeddings_norm, unit_user, seen_mask)
+        
+        # Article norms are precomputed, so this is a single matrix-vector product
+        scores = self.embeddings_norm @ unit_user
+        scores[seen_idx] = -np.inf
+        return scores
+    
+    def _top_n(self, scores, n):
+        """Return the n best (article_id, score) pairs, skipping masked articles."""
+        if scores is None:
+            return []
+        
+        n = min(n, int(np.count_nonzero(scores > -np.inf)))
+        if n <= 0:
+            return []
+        
+        # Select the top n in O(N) without sorting (or negating) the whole catalog,
+        # then sort only those n
+        top = np.argpartition(scores, -n)[-n:]
+        top = top[np.argsort(scores[top])[::-1]]
+        
+        return [(self.article_ids[i], float(scores[i])) for i in top]
     
-    def recommend(self, user_id, ratings_df, n=5):
+    def recommend(self, user_id, ratings_df=None, n=5):
         """
         Recommend articles for a specific user without using a pre-computed similarity matrix.
         
@@ -77,8 +212,8 @@ class ContentBasedRecommender:
         ----------
         user_id : int
             User ID to recommend articles for
-        ratings_df : pandas.DataFrame
-            DataFrame containing user_id, article_id, and rating columns
+        ratings_df : pandas.DataFrame, optional
+            Unused, seen articles are precomputed per user in fit (kept for backward compatibility)
         n : int, optional
             Number of recommendations to return (default is 5)
             
@@ -87,86 +222,13 @@ class ContentBasedRecommender:
         list
             List of tuples containing (article_id, similarity_score)
         """
-        # If user not in profiles, return empty recommendations
-        if user_id not in self.user_profiles:
-            return []
-        
-        user_profile = self.user_profiles[user_id]
-        user_vector = user_profile['vector']
-        
-        # Get articles the user has already interacted with
-        user_articles = set(ratings_df[ratings_df['user_id'] == user_id]['article_id'].unique())
-        
-        # Calculate similarity between user profile and candidate articles
-        # We'll do this in batches to avoid memory issues
-        batch_size = 1000  # Adjust based on available memory
-        scores = []
-        
-        # Process articles in batches
-        for i in range(0, len(self.article_ids), batch_size):
-            batch_ids = self.article_ids[i:i+batch_size]
-            batch_indices = [self.article_indices[aid] for aid in batch_ids 
-                            if aid not in user_articles]
-            
-            if not batch_indices:
-                continue
-                
-            # Get embeddings for this batch
-            batch_embeddings = self.embeddings[batch_indices]
-            
-            # Calculate cosine similarity for this batch
-            similarities = cosine_similarity([user_vector], batch_embeddings)[0]
-            
-            # Add scores for this batch
-            for j, idx in enumerate(batch_indices):
-                article_id = self.article_ids[i + j]
-                if article_id not in user_articles:
-                    scores.append((article_id, similarities[j]))
-        
-        # Sort by similarity score (descending)
-        scores.sort(key=lambda x: x[1], reverse=True)
-        
-        # Return top n recommendations
-        return scores[:n]
+        return self._top_n(self._score_all(user_id), n)
     
-    # Alternative recommendation method that processes one article at a time
-    # Slower but uses minimal memory
-    def recommend_low_memory(self, user_id, ratings_df, n=5):
+    def recommend_low_memory(self, user_id, ratings_df=None, n=5):
         """
-        Ultra-low memory version that processes one article at a time.
-        """
-        # If user not in profiles, return empty recommendations
-        if user_id not in self.user_profiles:
-            return []
-        
-        user_profile = self.user_profiles[user_id]
-        user_vector = user_profile['vector']
-        
-        # Get articles the user has already interacted with
-        user_articles = set(ratings_df[ratings_df['user_id'] == user_id]['article_id'].unique())
-        
-        # Calculate similarity scores one article at a time
-        scores = []
+        Alias of recommend, kept for backward compatibility.
         
-        for article_id in self.article_ids:
-            # Skip articles the user has already interacted with
-            if article_id in user_articles:
-                continue
-            
-            article_idx = self.article_indices[article_id]
-            article_vector = self.embeddings[article_idx]
-            
-            # Calculate cosine similarity between user vector and article vector
-            # Manual computation to avoid memory overhead
-            norm_user = np.linalg.norm(user_vector)
-            norm_article = np.linalg.norm(article_vector)
-            
-            if norm_user > 0 and norm_article > 0:
-                similarity = np.dot(user_vector, article_vector) / (norm_user * norm_article)
-                scores.append((article_id, similarity))
-        
-        # Sort by similarity score (descending)
-        scores.sort(key=lambda x: x[1], reverse=True)
-        
-        # Return top n recommendations
-        return scores[:n]
\ No newline at end of file
+        recommend no longer needs a per-article loop, so there is no separate
+        low-memory path any more.
+        """
+        return self.recommend(user_id, ratings_df=ratings_df, n=n)
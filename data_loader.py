@@ -2,11 +2,23 @@
 import os
 import io
 import pickle
+import hashlib
 import logging
+import tempfile
+import threading
 import numpy as np
 import pandas as pd
+from azure.core.exceptions import ResourceNotFoundError
 from azure.storage.blob import BlobServiceClient
 from content_based import ContentBasedRecommender
+from http_utils import dumps, join_array, join_lines
+
+# Only one thread per instance may load the data
+_load_lock = threading.Lock()
+
+# Part of the cached profiles blob name: bump it whenever the arrays written by
+# ContentBasedRecommender.export_profiles change, so old archives are not reused
+_PROFILES_FORMAT_VERSION = 1
 
 class DataLoader:
     """
@@ -23,12 +35,32 @@ class DataLoader:
     def __init__(self):
         if not DataLoader._initialized:
             self.cb_model = None
+            # Set once everything below is loaded; a plain attribute so warm
+            # requests only pay an attribute lookup
+            self.is_loaded = False
             self.df_ratings = None
             self.df_articles = None
+            self.df_articles_by_id = None
             self.df_user_stats = None
+            self.user_stats_rows = None
+            self.user_stats_json = None
+            self.user_stats_ndjson = None
             self.user_ids = None
+            self.user_ids_set = None
+            # Incremented each time the model is (re)built, used to key caches
+            self.generation = 0
             DataLoader._initialized = True
 
+    def ensure_loaded(self):
+        """
+        Load data once per instance; concurrent callers wait for the first load
+        """
+        if self.is_loaded:
+            return
+        with _load_lock:
+            if not self.is_loaded:
+                self.load_data()
+
     def load_data(self):
         """
         Load data from Azure Blob Storage and initialize recommendation model
@@ -60,7 +92,11 @@ class DataLoader:
 
             # Load clicks data
             logging.info("Loading clicks data...")
-            df_clicks = self._load_csv_from_blob(container_client, "clicks.csv")
+            df_clicks = self._load_csv_from_blob(
+                container_client, "clicks.csv",
+                usecols=["user_id", "article_id", "session_size"],
+                dtype={"user_id": "uint32", "article_id": "uint32"}
+            )
 
             if limit_data:
                 logging.warning("LIMIT_DATA_SIZE is enabled - loading subset of data")
@@ -71,12 +107,20 @@ class DataLoader:
 
             # Load articles metadata
             logging.info("Loading articles metadata...")
-            df_articles = self._load_csv_from_blob(container_client, "articles_metadata.csv")
+            df_articles = self._load_csv_from_blob(
+                container_client, "articles_metadata.csv",
+                usecols=["article_id", "category_id", "words_count"],
+                dtype={"article_id": "uint32"}
+            )
 
             # Load embeddings
             logging.info("Loading article embeddings...")
             try:
-                embeddings = self._load_pickle_from_blob(container_client, "articles_embeddings_reduced.pickle")
+                try:
+                    embeddings = self._load_npy_from_blob(container_client, "articles_embeddings_reduced.npy")
+                except ResourceNotFoundError:
+                    logging.info("No .npy embeddings found, falling back to pickle")
+                    embeddings = self._load_pickle_from_blob(container_client, "articles_embeddings_reduced.pickle")
                 logging.info(f"Embeddings loaded: type={type(embeddings)}")
             except MemoryError as e:
                 logging.error(f"MemoryError loading embeddings: {str(e)}")
@@ -93,18 +137,33 @@ class DataLoader:
             # Initialize and train model
             logging.info("Initializing recommendation model...")
             cb_model = ContentBasedRecommender(emb_matrix, indices, article_ids)
-            cb_model.fit(df_ratings)
+            self._fit_or_load_profiles(cb_model, df_ratings, container_client)
 
             # Calculate user statistics
             logging.info("Calculating user statistics...")
             df_user_stats = self._calculate_user_stats(df_ratings)
 
-            # Store in instance variables
-            self.cb_model = cb_model
+            # The users list never changes after load: serialize each row once,
+            # responses (full or paginated) are then assembled from these bytes
+            user_stats_rows = list(self._iter_user_stats_rows(df_user_stats))
+            user_stats_json = join_array(user_stats_rows)
+            user_stats_ndjson = join_lines(user_stats_rows)
+
+            # Store in instance variables (cb_model last: it marks the data as loaded)
             self.df_ratings = df_ratings
             self.df_articles = df_articles
+            # Metadata lookups by article_id (first row wins, as with a boolean mask)
+            self.df_articles_by_id = df_articles.drop_duplicates("article_id").set_index("article_id", drop=False)
             self.df_user_stats = df_user_stats
+            self.user_stats_rows = user_stats_rows
+            self.user_stats_json = user_stats_json
+            self.user_stats_ndjson = user_stats_ndjson
             self.user_ids = sorted(df_ratings["user_id"].unique().tolist())
+            # O(1) membership checks per request
+            self.user_ids_set = set(self.user_ids)
+            self.generation += 1
+            self.cb_model = cb_model
+            self.is_loaded = True
 
             logging.info(f"Data loaded successfully! {len(self.user_ids)} users, {len(df_articles)} articles")
             logging.info("=" * 60)
@@ -119,13 +178,18 @@ class DataLoader:
             logging.error(traceback.format_exc())
             raise
 
-    def _load_csv_from_blob(self, container_client, blob_name):
-        """Load CSV file from blob storage"""
+    def _load_csv_from_blob(self, container_client, blob_name, usecols=None, dtype=None):
+        """Load CSV file from blob storage, parsing only the requested columns"""
         try:
             blob_client = container_client.get_blob_client(blob_name)
             download_stream = blob_client.download_blob()
             data = io.BytesIO(download_stream.readall())
-            df = pd.read_csv(data)
+            try:
+                df = pd.read_csv(data, engine="pyarrow", usecols=usecols, dtype=dtype)
+            except ImportError:
+                logging.info("pyarrow not available, using the default CSV parser")
+                data.seek(0)
+                df = pd.read_csv(data, usecols=usecols, dtype=dtype)
             logging.info(f"Loaded {blob_name}: {len(df)} rows")
             return df
         except Exception as e:
@@ -145,18 +209,116 @@ class DataLoader:
             logging.error(f"Error loading {blob_name}: {str(e)}")
             raise
 
+    def _load_npy_from_blob(self, container_client, blob_name):
+        """Download .npy file from blob storage to a local file and memory-map it"""
+        try:
+            blob_client = container_client.get_blob_client(blob_name)
+            # Each worker process downloads to its own file: truncating a file
+            # another worker has mapped would corrupt or crash (SIGBUS) its reads
+            fd, tmp_path = tempfile.mkstemp(dir=tempfile.gettempdir(), suffix=".npy")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    blob_client.download_blob().readinto(f)
+                data = np.load(tmp_path, mmap_mode="r")
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            # Renaming keeps a single copy on disk; existing mappings keep their inode
+            os.replace(tmp_path, os.path.join(tempfile.gettempdir(), blob_name))
+            logging.info(f"Loaded {blob_name}, shape: {data.shape}, dtype: {data.dtype}")
+            return data
+        except ResourceNotFoundError:
+            raise
+        except Exception as e:
+            logging.error(f"Error loading {blob_name}: {str(e)}")
+            raise
+
+    def _load_npz_from_blob(self, container_client, blob_name):
+        """Load .npz archive from blob storage into a dict of arrays"""
+        try:
+            blob_client = container_client.get_blob_client(blob_name)
+            # Stream to a private temp file so only the decoded arrays are held in
+            # memory (.npz members cannot be memory-mapped by np.load)
+            fd, tmp_path = tempfile.mkstemp(suffix=".npz")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    blob_client.download_blob().readinto(f)
+                with np.load(tmp_path) as archive:
+                    data = dict(archive)
+            finally:
+                os.remove(tmp_path)
+            logging.info(f"Loaded {blob_name}, arrays: {list(data)}")
+            return data
+        except ResourceNotFoundError:
+            raise
+        except Exception as e:
+            logging.error(f"Error loading {blob_name}: {str(e)}")
+            raise
+
+    def _fit_or_load_profiles(self, cb_model, df_ratings, container_client):
+        """
+        Restore fitted user profiles from blob storage, or fit the model and upload them
+
+        The blob name is derived from a hash of the model inputs and the archive
+        format version, so profiles are refitted whenever the ratings, embeddings
+        or exported arrays change.
+        """
+        blob_name = f"profiles_{self._profiles_key(cb_model, df_ratings)}.npz"
+
+        try:
+            cb_model.load_profiles(self._load_npz_from_blob(container_client, blob_name))
+            logging.info(f"Using fitted profiles from {blob_name}")
+            return
+        except ResourceNotFoundError:
+            logging.info(f"No fitted profiles found ({blob_name}), fitting model...")
+        except Exception as e:
+            # An unreadable or incompatible archive is refitted and overwritten below,
+            # otherwise every cold start would fail on the same blob
+            logging.warning(f"Could not restore fitted profiles from {blob_name}, fitting model: {str(e)}")
+
+        cb_model.fit(df_ratings)
+
+        # Caching is best effort: a failed upload only means the next cold start fits again
+        try:
+            # Write the archive to a private temp file and upload from disk, so it
+            # is never held in memory next to the profile matrix
+            fd, tmp_path = tempfile.mkstemp(suffix=".npz")
+            try:
+                with os.fdopen(fd, "w+b") as f:
+                    np.savez(f, **cb_model.export_profiles())
+                    f.seek(0)
+                    container_client.get_blob_client(blob_name).upload_blob(f, overwrite=True)
+            finally:
+                os.remove(tmp_path)
+            logging.info(f"Uploaded fitted profiles to {blob_name}")
+        except Exception as e:
+            logging.warning(f"Could not upload fitted profiles: {str(e)}")
+
+    def _profiles_key(self, cb_model, df_ratings):
+        """Content hash of the inputs of ContentBasedRecommender.fit"""
+        digest = hashlib.sha1(f"v{_PROFILES_FORMAT_VERSION}".encode())
+        digest.update(str(cb_model.embeddings.dtype).encode())
+        digest.update(np.ascontiguousarray(cb_model.embeddings))
+        digest.update(np.asarray(cb_model.article_ids, dtype=np.int64))
+        for column in ["user_id", "article_id", "rating"]:
+            digest.update(np.ascontiguousarray(df_ratings[column].to_numpy()))
+        return digest.hexdigest()
+
     def _prepare_ratings(self, df_clicks):
         """Create implicit ratings from click data"""
-        df = df_clicks.copy()
+        df = df_clicks[["user_id", "article_id", "session_size"]].copy()
         df["session_size"] = pd.to_numeric(df["session_size"], errors="coerce")
         df.dropna(subset=["session_size"], inplace=True)
-        df["log_session_size"] = np.log1p(df["session_size"])
-        q25, q75 = df["log_session_size"].quantile([0.25, 0.75])
+        log_session_size = np.log1p(df["session_size"].to_numpy())
+        q25, q75 = np.quantile(log_session_size, [0.25, 0.75])
 
-        df_ratings = df[["user_id", "article_id"]].copy()
-        df_ratings["rating"] = df["log_session_size"].apply(
-            lambda x: 1 if x <= q25 else 2 if x <= q75 else 3
-        )
+        # Keep the ratings table small: it stays in memory for the life of the instance
+        df_ratings = pd.DataFrame({
+            "user_id": pd.to_numeric(df["user_id"], downcast="unsigned"),
+            "article_id": pd.to_numeric(df["article_id"], downcast="unsigned"),
+        })
+        # 1 if <= q25, 2 if <= q75, else 3 (pd.cut would reject equal quartiles)
+        df_ratings["rating"] = (np.searchsorted([q25, q75], log_session_size) + 1).astype(np.int8)
 
         logging.info(f"Prepared {len(df_ratings)} ratings")
         return df_ratings
@@ -173,8 +335,16 @@ class DataLoader:
             article_ids = df_articles["article_id"].tolist()
             matrix = embeddings
 
+        # float32 halves memory and bandwidth vs float64; float16 can be enabled
+        # via EMBEDDING_DTYPE on very memory-constrained plans. A memory-mapped
+        # .npy already in the target dtype is kept as is, without a copy
+        dtype = np.dtype(os.environ.get("EMBEDDING_DTYPE", "float32"))
+        if dtype not in (np.float32, np.float16):
+            raise ValueError(f"Unsupported EMBEDDING_DTYPE: {dtype}")
+        matrix = np.ascontiguousarray(matrix, dtype=dtype)
+
         indices = {aid: i for i, aid in enumerate(article_ids)}
-        logging.info(f"Embeddings matrix shape: {matrix.shape}")
+        logging.info(f"Embeddings matrix shape: {matrix.shape}, dtype: {matrix.dtype}")
 
         return article_ids, matrix, indices
 
@@ -191,5 +361,14 @@ class DataLoader:
         logging.info(f"Calculated stats for {len(stats)} users")
         return stats
 
+    def _iter_user_stats_rows(self, df_user_stats):
+        """Serialize user statistics one row at a time, without a list of record dicts"""
+        for user_id, n, avg_rating in zip(
+            df_user_stats["user_id"].tolist(),
+            df_user_stats["n"].tolist(),
+            df_user_stats["avg_rating"].tolist()
+        ):
+            yield dumps({"user_id": user_id, "n": n, "avg_rating": avg_rating})
+
 # Global instance
 data_loader = DataLoader()
@@ -79,6 +79,17 @@ if [ -d "../dataset" ]; then
         --name articles_embeddings_reduced.pickle \
         --connection-string "$STORAGE_CONNECTION_STRING" \
         --overwrite
+
+    # Optional: embeddings as .npy are memory-mapped instead of unpickled
+    if [ -f "../dataset/articles_embeddings_reduced.npy" ]; then
+        echo "  - Uploading articles_embeddings_reduced.npy..."
+        az storage blob upload \
+            --container-name $CONTAINER_NAME \
+            --file ../dataset/articles_embeddings_reduced.npy \
+            --name articles_embeddings_reduced.npy \
+            --connection-string "$STORAGE_CONNECTION_STRING" \
+            --overwrite
+    fi
 else
     echo "Warning: ../dataset directory not found. Please upload data files manually."
 fi
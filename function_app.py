@@ -2,6 +2,7 @@
 import os
 import json
 import logging
+import threading
 import azure.functions as func
 
 # Configure logging
@@ -45,8 +46,18 @@ except Exception as e:
     logging.error(traceback.format_exc())
     raise
 
+# Start loading data in the background so the first request finds the model warm
+def _preload_data():
+    try:
+        from data_loader import data_loader
+        data_loader.ensure_loaded()
+    except Exception as e:
+        logging.error(f"Background data load failed, will retry on first request: {str(e)}")
+
+threading.Thread(target=_preload_data, name="data-preload", daemon=True).start()
+
 @app.route(route="recommend", methods=["GET"])
-def recommend(req: func.HttpRequest) -> func.HttpResponse:
+async def recommend(req: func.HttpRequest) -> func.HttpResponse:
     """
     HTTP trigger to get article recommendations for a user
 
@@ -58,7 +69,7 @@ def recommend(req: func.HttpRequest) -> func.HttpResponse:
     - JSON array of recommended articles with scores
     """
     logging.info('Processing recommendation request')
-    return recommend_handler.handle(req)
+    return await recommend_handler.handle(req)
 
 @app.route(route="users", methods=["GET"])
 def users(req: func.HttpRequest) -> func.HttpResponse:
@@ -1,8 +1,8 @@
 # health.py - Health check endpoint handler
-import json
 import logging
 import azure.functions as func
 from data_loader import data_loader
+from http_utils import dumps, etag_response, json_response
 
 class HealthFunction:
     """Handler for health check endpoint"""
@@ -15,7 +15,7 @@ class HealthFunction:
         """
         try:
             # Check if data is loaded (but don't load it during health check)
-            is_loaded = data_loader.cb_model is not None
+            is_loaded = data_loader.is_loaded
 
             # Get statistics
             stats = {
@@ -26,21 +26,15 @@ class HealthFunction:
                 "total_ratings": len(data_loader.df_ratings) if is_loaded and data_loader.df_ratings is not None else 0
             }
 
-            return func.HttpResponse(
-                json.dumps(stats),
-                mimetype="application/json"
-            )
+            return etag_response(req, dumps(stats))
 
         except Exception as e:
-            logging.error(f"Error in health endpoint: {str(e)}")
-            import traceback
-            logging.error(traceback.format_exc())
-            return func.HttpResponse(
-                json.dumps({
+            # The traceback goes to the logs only, never to the client
+            logging.exception(f"Error in health endpoint: {str(e)}")
+            return json_response(
+                dumps({
                     "status": "error",
-                    "error": str(e),
-                    "trace": traceback.format_exc()
+                    "error": str(e)
                 }),
-                status_code=500,
-                mimetype="application/json"
+                status_code=500
             )
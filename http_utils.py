@@ -0,0 +1,92 @@
+# http_utils.py - Helpers shared by the endpoint handlers
+import hashlib
+from functools import lru_cache
+import azure.functions as func
+
+# orjson is several times faster than the stdlib encoder, produces bytes and
+# serializes numpy scalars natively; json is only a fallback
+try:
+    import orjson
+
+    def dumps(obj) -> bytes:
+        """Serialize obj to JSON bytes (numpy scalars and arrays allowed)"""
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+
+except ImportError:
+    import json
+
+    def _numpy_default(obj):
+        """Convert numpy scalars and arrays for the stdlib encoder"""
+        if hasattr(obj, "tolist"):
+            return obj.tolist()
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    def dumps(obj) -> bytes:
+        """Serialize obj to JSON bytes (numpy scalars and arrays allowed)"""
+        return json.dumps(obj, default=_numpy_default).encode("utf-8")
+
+def join_array(fragments) -> bytes:
+    """Assemble already serialized JSON values into a JSON array"""
+    return b"[" + b",".join(fragments) + b"]"
+
+def join_lines(fragments) -> bytes:
+    """Assemble already serialized JSON values into NDJSON, one per line"""
+    return b"".join(fragment + b"\n" for fragment in fragments)
+
+# Payloads pre-serialized at load time are the same bytes objects on every
+# request; bytes cache their hash, so repeated lookups here are O(1)
+@lru_cache(maxsize=16)
+def compute_etag(body: bytes) -> str:
+    """Strong ETag for a response body"""
+    return '"' + hashlib.md5(body, usedforsecurity=False).hexdigest() + '"'
+
+def json_response(body: bytes, status_code=200, mimetype="application/json", headers=None) -> func.HttpResponse:
+    """
+    Build a response from an already serialized body
+
+    The body is passed as bytes so the runtime does not encode it again,
+    and Content-Length is set from it.
+    """
+    headers = dict(headers or {})
+    headers["Content-Length"] = str(len(body))
+    return func.HttpResponse(body, status_code=status_code, mimetype=mimetype, headers=headers)
+
+def etag_response(req: func.HttpRequest, body, mimetype="application/json") -> func.HttpResponse:
+    """
+    Build a response carrying an ETag header
+
+    Returns 304 Not Modified (no body) when the client's If-None-Match
+    header matches the ETag of the body.
+    """
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+
+    etag = compute_etag(body)
+    if_none_match = req.headers.get("If-None-Match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return func.HttpResponse(status_code=304, headers={"ETag": etag})
+
+    return json_response(body, mimetype=mimetype, headers={"ETag": etag})
+
+# Error bodies for bad query parameters, serialized once per message
+@lru_cache(maxsize=32)
+def _param_error(message: str) -> bytes:
+    return dumps({"error": message})
+
+def int_param(params, name, default=None, required=False):
+    """
+    Parse an integer query parameter
+
+    Returns (value, None), or (None, 400 response) when the parameter is
+    required and missing or is not an integer. Missing or empty optional
+    parameters give the default.
+    """
+    value = params.get(name)
+    if not value:
+        if required:
+            return None, json_response(_param_error(f"{name} parameter is required"), status_code=400)
+        return default, None
+    try:
+        return int(value), None
+    except ValueError:
+        return None, json_response(_param_error(f"{name} parameter must be an integer"), status_code=400)
@@ -1,96 +1,162 @@
 # recommend.py - Recommendation endpoint handler
-import json
+import asyncio
 import logging
+import threading
+import numpy as np
 import azure.functions as func
+from cachetools import TTLCache
 from data_loader import data_loader
+from http_utils import dumps, int_param, join_array, json_response
+
+# Serialized responses keyed by (data generation, user_id, n, with_meta, score_q4):
+# Streamlit reruns and hot users repeat identical requests
+_responses_cache = TTLCache(maxsize=4096, ttl=300)
+_cache_lock = threading.Lock()
+
+# The cache bounds entries, not bytes: only bodies up to this n are cached
+# (the client asks for at most 20), larger requests are always rebuilt
+_MAX_CACHED_N = 100
+
+# Response records have a fixed shape, so they are formatted straight to JSON
+# bytes; %.4f rounds the score. Metadata values go through dumps for escaping
+_FMT_NOMETA = b'{"article_id":%d,"score":%.4f}'
+_FMT_META = b'{"article_id":%d,"score":%.4f,"category_id":%s,"words_count":%s}'
+
+# Opt-in compact shape: score quantized to an integer number of 1e-4 units
+_FMT_NOMETA_Q4 = b'{"article_id":%d,"score_q4":%d}'
+_FMT_META_Q4 = b'{"article_id":%d,"score_q4":%d,"category_id":%s,"words_count":%s}'
+
+# Unknown user ids are the common error, only the id is formatted in
+_FMT_NOT_FOUND = b'{"error":"User %d not found"}'
 
 class RecommendFunction:
     """Handler for recommendation endpoint"""
 
-    def handle(self, req: func.HttpRequest) -> func.HttpResponse:
+    async def handle(self, req: func.HttpRequest) -> func.HttpResponse:
         """
         Handle recommendation request
 
+        Loading and scoring run in the default executor so the worker's
+        event loop keeps serving other requests meanwhile.
+
         Query parameters:
         - user_id (required): User ID
         - n (optional): Number of recommendations (default: 5)
         - with_meta (optional): Include article metadata (default: false)
+        - score_q4 (optional): Return integer "score_q4" (score * 10000)
+          instead of "score" (default: false)
         """
         try:
-            # Load data if not already loaded
-            data_loader.load_data()
-
-            # Get parameters
-            user_id = req.params.get("user_id")
-            n = int(req.params.get("n", 5))
-            with_meta = req.params.get("with_meta", "false").lower() == "true"
-
-            # Validate user_id
-            if not user_id:
-                return func.HttpResponse(
-                    json.dumps({"error": "user_id parameter is required"}),
-                    status_code=400,
-                    mimetype="application/json"
+            loop = asyncio.get_running_loop()
+
+            # Data is normally preloaded at startup; only a cold or failed preload loads here
+            try:
+                if not data_loader.is_loaded:
+                    await loop.run_in_executor(None, data_loader.ensure_loaded)
+            except Exception as load_error:
+                logging.error(f"Failed to load data: {str(load_error)}")
+                return json_response(
+                    dumps({"error": "Data loading failed", "details": str(load_error)}),
+                    status_code=503
                 )
 
-            user_id = int(user_id)
+            # Get parameters (query string parsed once)
+            # Numeric parameters are validated up front, first bad one returns 400
+            params = req.params
+            user_id, error = int_param(params, "user_id", required=True)
+            if error:
+                return error
+            n, error = int_param(params, "n", default=5)
+            if error:
+                return error
+            with_meta = params.get("with_meta", "false").lower() == "true"
+            score_q4 = params.get("score_q4", "false").lower() == "true"
 
             # Check if user exists
-            if user_id not in data_loader.user_ids:
-                return func.HttpResponse(
-                    json.dumps({"error": f"User {user_id} not found"}),
-                    status_code=404,
-                    mimetype="application/json"
+            if user_id not in data_loader.user_ids_set:
+                return json_response(
+                    _FMT_NOT_FOUND % user_id,
+                    status_code=404
                 )
 
             # Get recommendations
-            logging.info(f"Getting {n} recommendations for user {user_id}")
-            recommendations = data_loader.cb_model.recommend(
-                user_id,
-                data_loader.df_ratings,
-                n=n
-            )
+            logging.info("Getting %d recommendations for user %d", n, user_id)
 
-            # Format response
-            result = []
-            for article_id, score in recommendations:
-                rec = {
-                    "article_id": int(article_id),
-                    "score": round(float(score), 4)
-                }
-
-                # Add metadata if requested
-                if with_meta:
-                    article_info = data_loader.df_articles[
-                        data_loader.df_articles["article_id"] == article_id
-                    ]
-                    if not article_info.empty:
-                        article_row = article_info.iloc[0]
-                        rec["category_id"] = str(article_row.get("category_id", "N/A"))
-                        rec["words_count"] = int(article_row.get("words_count", 0))
-
-                result.append(rec)
-
-            logging.info(f"Returning {len(result)} recommendations")
-
-            return func.HttpResponse(
-                json.dumps(result),
-                mimetype="application/json"
-            )
+            return json_response(await self._get_response_body(loop, user_id, n, with_meta, score_q4))
 
-        except ValueError as e:
-            logging.error(f"Validation error: {str(e)}")
-            return func.HttpResponse(
-                json.dumps({"error": str(e)}),
-                status_code=400,
-                mimetype="application/json"
-            )
         except Exception as e:
-            logging.error(f"Error in recommend endpoint: {str(e)}")
-            import traceback
-            logging.error(traceback.format_exc())
-            return func.HttpResponse(
-                json.dumps({"error": "Internal server error", "details": str(e)}),
-                status_code=500,
-                mimetype="application/json"
+            logging.exception(f"Error in recommend endpoint: {str(e)}")
+            return json_response(
+                dumps({"error": "Internal server error", "details": str(e)}),
+                status_code=500
             )
+
+    async def _get_response_body(self, loop, user_id, n, with_meta, score_q4):
+        """Serialized top n recommendations for a user, cached for a few minutes when n is small"""
+        if n > _MAX_CACHED_N:
+            return await loop.run_in_executor(None, self._build_body, user_id, n, with_meta, score_q4)
+
+        key = (data_loader.generation, user_id, n, with_meta, score_q4)
+        with _cache_lock:
+            body = _responses_cache.get(key)
+        if body is None:
+            # Only cache misses pay for the executor hop
+            body = await loop.run_in_executor(None, self._build_body, user_id, n, with_meta, score_q4)
+            with _cache_lock:
+                _responses_cache[key] = body
+        return body
+
+    def _build_body(self, user_id, n, with_meta, score_q4):
+        """Score articles for a user and format them as a JSON array"""
+        # Seen articles are indexed per user in fit, no ratings scan per request
+        recommendations = data_loader.cb_model.recommend(user_id, n=n)
+        # Nothing left to recommend (e.g. n=0): skip the metadata lookup
+        if not recommendations:
+            logging.info("Returning 0 recommendations")
+            return b"[]"
+
+        article_ids = [article_id for article_id, _ in recommendations]
+        if score_q4:
+            # Quantize all scores in one pass
+            scores = np.fromiter((score for _, score in recommendations), dtype=np.float64, count=len(recommendations))
+            scores = np.rint(scores * 10000).astype(np.int32).tolist()
+            fmt_nometa, fmt_meta = _FMT_NOMETA_Q4, _FMT_META_Q4
+        else:
+            # _top_n already returns Python floats
+            scores = [score for _, score in recommendations]
+            fmt_nometa, fmt_meta = _FMT_NOMETA, _FMT_META
+        if with_meta:
+            records = self._build_with_meta(article_ids, scores, fmt_meta, fmt_nometa)
+        else:
+            records = self._build_no_meta(article_ids, scores, fmt_nometa)
+
+        logging.info("Returning %d recommendations", len(records))
+        return join_array(records)
+
+    def _build_no_meta(self, article_ids, scores, fmt_nometa=_FMT_NOMETA):
+        """Response records with article_id and score only"""
+        return [
+            fmt_nometa % (article_id, score)
+            for article_id, score in zip(article_ids, scores)
+        ]
+
+    def _build_with_meta(self, article_ids, scores, fmt_meta=_FMT_META, fmt_nometa=_FMT_NOMETA):
+        """Response records with article metadata, one index lookup for all articles"""
+        df_meta = data_loader.df_articles_by_id
+        positions = df_meta.index.get_indexer(article_ids)
+        category_ids = df_meta["category_id"].to_numpy()
+        words_counts = df_meta["words_count"].to_numpy()
+
+        result = []
+        for article_id, score, position in zip(article_ids, scores, positions):
+            # Articles missing from the metadata get no metadata fields
+            if position >= 0:
+                result.append(fmt_meta % (
+                    article_id,
+                    score,
+                    dumps(str(category_ids[position])),
+                    dumps(words_counts[position])
+                ))
+            else:
+                result.append(fmt_nometa % (article_id, score))
+        return result
@@ -1,8 +1,8 @@
 # users.py - Users endpoint handler
-import json
 import logging
 import azure.functions as func
 from data_loader import data_loader
+from http_utils import dumps, etag_response, int_param, json_response, join_array, join_lines
 
 class UsersFunction:
     """Handler for users endpoint"""
@@ -14,56 +14,58 @@ class UsersFunction:
         Query parameters:
         - limit (optional): Limit number of results
         - offset (optional): Offset for pagination
+        - format (optional): "ndjson" for one JSON object per line (default: JSON array)
         """
         try:
-            # Try to load data
+            # Data is normally preloaded at startup; only a cold or failed preload loads here
             try:
-                data_loader.load_data()
+                if not data_loader.is_loaded:
+                    data_loader.ensure_loaded()
             except Exception as load_error:
                 logging.error(f"Failed to load data: {str(load_error)}")
                 # Return error with helpful message
-                return func.HttpResponse(
-                    json.dumps({
+                return json_response(
+                    dumps({
                         "error": "Data loading failed",
                         "details": str(load_error),
                         "message": "The application is running on a Consumption plan with limited memory. Please consider upgrading to a Premium plan or reducing data size."
                     }),
-                    status_code=503,
-                    mimetype="application/json"
+                    status_code=503
                 )
 
             # Get pagination parameters
-            limit = req.params.get("limit")
-            offset = req.params.get("offset", 0)
+            params = req.params
+            limit, error = int_param(params, "limit")
+            if error:
+                return error
+            offset, error = int_param(params, "offset", default=0)
+            if error:
+                return error
 
-            if limit:
-                limit = int(limit)
-            if offset:
-                offset = int(offset)
+            # NDJSON lets the client parse users line by line as they arrive
+            ndjson = params.get("format") == "ndjson"
 
-            # Get user stats
-            df_stats = data_loader.df_user_stats
+            # Full list: serve the payload serialized at load time
+            if not limit:
+                logging.info("Returning %d users", len(data_loader.df_user_stats))
+                if ndjson:
+                    return etag_response(req, data_loader.user_stats_ndjson, mimetype="application/x-ndjson")
+                return etag_response(req, data_loader.user_stats_json)
 
-            # Apply pagination if requested
-            if limit:
-                df_stats = df_stats.iloc[offset:offset + limit]
+            # Apply pagination on the rows serialized at load time
+            rows = data_loader.user_stats_rows[offset:offset + limit]
 
-            # Convert to list of dictionaries
-            users_data = df_stats.to_dict("records")
+            logging.info("Returning %d users", len(rows))
 
-            logging.info(f"Returning {len(users_data)} users")
+            if ndjson:
+                return etag_response(req, join_lines(rows), mimetype="application/x-ndjson")
 
-            return func.HttpResponse(
-                json.dumps(users_data),
-                mimetype="application/json"
-            )
+            return etag_response(req, join_array(rows))
 
         except Exception as e:
-            logging.error(f"Error in users endpoint: {str(e)}")
-            import traceback
-            logging.error(traceback.format_exc())
-            return func.HttpResponse(
-                json.dumps({"error": "Internal server error", "details": str(e), "trace": traceback.format_exc()}),
-                status_code=500,
-                mimetype="application/json"
+            # The traceback goes to the logs only, never to the client
+            logging.exception(f"Error in users endpoint: {str(e)}")
+            return json_response(
+                dumps({"error": "Internal server error", "details": str(e)}),
+                status_code=500
             )